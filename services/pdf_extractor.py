@@ -1,94 +1,790 @@
 """
-PDF Extraction Service using pdfplumber
-Extracts text with layout preservation for Claude Search Results API
+PDF Extraction Service using pypdfium2 and pdfplumber
+Extracts page text and tables for Claude Search Results API
 """
 import pdfplumber
+import argparse
+import csv
+import hashlib
+import io
 import json
+import math
+import mmap
+import os
+import pathlib
+import queue
 import sys
-from typing import List, Dict, Any
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import accumulate, islice, repeat
+from pdfminer.pdfpage import PDFPage
+from pdfplumber.page import Page
+from typing import List, Dict, Any, BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Tuple
 
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:  # pdfplumber's own text path is used instead
+    pdfium = None
 
-def extract_pdf_for_search_results(pdf_path: str, max_pages: int = 10) -> List[Dict[str, Any]]:
+try:
+    import orjson
+except ImportError:  # stdlib json is used instead
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # cache entries are stored as plain JSON
+    zstandard = None
+
+
+# PDF parsing stops scaling (and starts regressing) past ~6-8 worker processes
+MAX_WORKERS_CAP = 8
+
+# Tolerances for the default (non-layout) text path
+TEXT_SETTINGS = {"x_tolerance": 2, "y_tolerance": 3}
+
+# Single-column detection: a column gutter is a vertical strip at least
+# COLUMN_MIN_GUTTER pt wide covered by under COLUMN_GUTTER_RATIO of the peak
+# line coverage; lines spanning COLUMN_SPAN_RATIO of the text width (titles,
+# abstracts) are ignored
+COLUMN_MIN_GUTTER = 6
+COLUMN_GUTTER_RATIO = 0.1
+COLUMN_SPAN_RATIO = 0.75
+
+# Tables are detected from ruling lines only; pages with fewer edges can't hold one
+TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+MIN_TABLE_EDGES = 4
+
+# Files at least this large are memory-mapped so the kernel can read ahead sequentially
+MMAP_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+# Bound on results buffered between extraction and the stream serializer
+STREAM_QUEUE_SIZE = 32
+
+# Bound on pages prefetched by the PDFium load stage ahead of extraction
+PIPELINE_QUEUE_SIZE = 4
+
+_TABLE_HEADER = "\n[Table {}]\n".format
+
+# Result cache: bump CACHE_VERSION whenever the search_result output changes
+CACHE_VERSION = 6
+CACHE_PROBE_BYTES = 64 * 1024
+# Entries unused for this long are evicted, then oldest-first down to the size cap
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes, compact unless indent is set.
+
+    Falls back to stdlib json for data orjson rejects, such as lone
+    surrogates in text decoded from broken font encodings.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:  # orjson.JSONEncodeError
+            pass
+    if indent:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+@contextmanager
+def _open_pdf(pdf_path: str, pages: Sequence[int] = ()):
+    """
+    Open the PDF with pdfplumber, memory-mapping large files.
+
+    pages lists the page numbers pdf.pages builds Page objects for, and so
+    also the ones pdf.close() builds (it iterates pdf.pages). It defaults to
+    none: callers construct the pages they extract with _iter_pages.
+
+    pdfplumber.open(path) already reads the file on demand through a buffered
+    handle, so mapping saves no heap copy; what it adds is MADV_SEQUENTIAL
+    readahead, which helps when large files are read from slow storage.
+    """
+    if os.path.getsize(pdf_path) < MMAP_THRESHOLD_BYTES:
+        with pdfplumber.open(pdf_path, pages=pages) as pdf:
+            yield pdf
+        return
+
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with pdfplumber.open(mm, pages=pages) as pdf:
+            yield pdf
+
+
+@contextmanager
+def _pdfium_document(pdf_path: str, enabled: bool = True):
+    """Open the PDF with PDFium for the fast text path; yields None if unavailable."""
+    if not enabled or pdfium is None:
+        yield None
+        return
+    try:
+        doc = pdfium.PdfDocument(pdf_path)
+    except Exception:
+        yield None
+        return
+    try:
+        yield doc
+    finally:
+        doc.close()
+
+
+def _pdfium_has_objects(page, object_type: int) -> bool:
+    return next(page.get_objects(filter=[object_type]), None) is not None
+
+
+def _pdfium_page_text(pdfium_doc, page_index: int) -> Optional[Tuple[Optional[str], bool]]:
+    """
+    Return (text, has_path_objects) for a page using PDFium's C++ extractor.
+
+    Image-only (scanned) pages return (None, False) so callers can skip them
+    without running any further extraction. Returns None if PDFium fails on
+    the page, in which case callers fall back to pdfplumber's text path.
+    """
+    try:
+        page = pdfium_doc[page_index]
+    except Exception:
+        return None
+    try:
+        textpage = page.get_textpage()
+        try:
+            num_chars = textpage.count_chars()
+            text = textpage.get_text_bounded().replace("\r\n", "\n") if num_chars else ""
+        finally:
+            textpage.close()
+        if not num_chars and _pdfium_has_objects(page, pdfium_c.FPDF_PAGEOBJ_IMAGE):
+            return None, False
+        # Ruling lines are path objects; without any there is nothing for the table finder
+        return text, _pdfium_has_objects(page, pdfium_c.FPDF_PAGEOBJ_PATH)
+    except Exception:
+        return None
+    finally:
+        page.close()
+
+
+def _iter_pdfium_prefetch(
+    pdfium_doc,
+    num_pages: int,
+    start: int = 0,
+) -> Iterator[Optional[Tuple[Optional[str], bool]]]:
+    """
+    Yield _pdfium_page_text results for pages start..num_pages-1, computed
+    ahead on a background thread.
+
+    This is the load stage of the in-process pipeline (load -> extract ->
+    serialize). PDFium's C calls release the GIL, so text for upcoming pages
+    is produced while the consumer runs pdfplumber's table pass. PDFium is
+    not thread-safe, so pdfium_doc must not be used elsewhere meanwhile;
+    pdfminer objects stay on the consuming thread since they share one file
+    handle.
+    """
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    # Exception that killed the loader thread, re-raised on the consumer side
+    load_error: List[BaseException] = []
+
+    def load() -> None:
+        try:
+            for i in range(start, num_pages):
+                item = _pdfium_page_text(pdfium_doc, i)
+                while not stop.is_set():
+                    try:
+                        pending.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            load_error.append(e)
+
+    def get() -> Any:
+        # Don't wait on a loader that has died, or we would block forever
+        while True:
+            try:
+                return pending.get(timeout=0.1)
+            except queue.Empty:
+                if not loader.is_alive() and pending.empty():
+                    if load_error:
+                        raise load_error[0]
+                    raise RuntimeError("PDFium loader stopped before all pages were read")
+
+    loader = threading.Thread(target=load, daemon=True)
+    loader.start()
+    try:
+        for _ in range(start, num_pages):
+            yield get()
+    finally:
+        # Consumer finished or bailed out early: let the loader exit before the document closes
+        stop.set()
+        loader.join()
+
+
+def _format_tables(tables: List[List[List[Optional[str]]]]) -> str:
+    """
+    Serialize extracted tables as pipe-delimited CSV under [Table N] headers.
+
+    The C writer renders None as an empty cell and quotes cells containing
+    "|", quotes or line breaks, doubling embedded quotes (a"b -> "a""b").
+    Rows with no non-empty cell are dropped; csv would write a lone empty
+    cell as "".
+    """
+    table_buf = io.StringIO()
+    writer = csv.writer(table_buf, delimiter="|", lineterminator="\n")
+    for j, table in enumerate(tables):
+        table_buf.write(_TABLE_HEADER(j + 1))
+        writer.writerows(row for row in table if any(row))
+    return table_buf.getvalue()
+
+
+def _extract_page(
+    page,
+    page_num: int,
+    preserve_layout: bool = False,
+    pdfium_text: Optional[Tuple[Optional[str], bool]] = None,
+    citations: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Build the search_result block for a single pdfplumber page (None if empty).
+
+    pdfium_text is the page's _pdfium_page_text result; when None, text comes
+    from pdfplumber instead. citations is the block's citations setting,
+    shared by every block of one extraction (a new one if omitted).
+    """
+    text = None
+    if pdfium_text is not None and not preserve_layout:
+        text, may_have_tables = pdfium_text
+        # Scanned/image-only page: no text layer to extract
+        if text is None:
+            return None
+
+    if text is None:
+        # Scanned page without a text layer: skip before paying for text extraction
+        if not page.chars and page.images:
+            return None
+        may_have_tables = True
+        # Layout mode pads text onto a character grid; it is much slower and
+        # only adds whitespace tokens, so it is opt-in
+        if preserve_layout:
+            text = page.extract_text(layout=True) or ""
+        else:
+            text = page.extract_text(**TEXT_SETTINGS) or ""
+    text = text.strip()
+
+    # Extract tables separately for better structure. A ruled table needs at
+    # least four edges, so skip table detection outright on text-only pages.
+    tables = []
+    if may_have_tables and len(page.edges) >= MIN_TABLE_EDGES:
+        tables = [table for table in (t.extract() for t in page.find_tables(table_settings=TABLE_SETTINGS)) if table]
+
+    # Skip blank/cover pages before serializing anything
+    if not text and not tables:
+        return None
+
+    # Combine text and tables
+    full_text = text
+    table_text = _format_tables(tables)
+    if table_text:
+        full_text = "\n\n--- Tables ---".join([text, table_text]).strip()
+
+    # Create search_result block
+    return {
+        "type": "search_result",
+        "source": f"page-{page_num}",
+        "title": f"Page {page_num}",
+        "content": [
+            {
+                "type": "text",
+                "text": full_text
+            }
+        ],
+        "citations": citations if citations is not None else {"enabled": True}
+    }
+
+
+def _extract_one_page(pdf_path: str, page_index: int, preserve_layout: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Worker entry point: open the PDF and extract a single page.
+
+    Kept at module level so it can be pickled by ProcessPoolExecutor.
+    """
+    page_num = page_index + 1
+    with _open_pdf(pdf_path, pages=[page_num]) as pdf, \
+            _pdfium_document(pdf_path, enabled=not preserve_layout) as pdfium_doc:
+        if not pdf.pages:
+            # The page tree has fewer pages than the driver counted
+            return None
+        pdfium_text = _pdfium_page_text(pdfium_doc, page_index) if pdfium_doc is not None else None
+        return _extract_page(pdf.pages[0], page_num, preserve_layout, pdfium_text)
+
+
+def _count_pages(pdf, limit: Optional[int] = None) -> int:
+    """
+    Count pages by walking the page tree, stopping after limit pages.
+
+    The catalog's /Pages /Count is not used: it is frequently wrong in
+    real-world PDFs. Walking only reads page dictionaries; no pdfplumber
+    Page objects are built as long as pdf was opened without selecting any
+    pages (see _open_pdf).
+    """
+    return sum(1 for _ in islice(PDFPage.create_pages(pdf.doc), limit))
+
+
+def _iter_pages(pdf, num_pages: int) -> Iterator[Page]:
+    """
+    Lazily construct the first num_pages pages.
+
+    pdf.pages builds a Page for every selected page up front; walking the
+    page tree with islice only creates the pages we actually extract. These
+    pages are not tracked by pdf, so callers close them.
+    """
+    doctop = 0
+    for i, page_obj in enumerate(islice(PDFPage.create_pages(pdf.doc), num_pages)):
+        page = Page(pdf, page_obj, page_number=i + 1, initial_doctop=doctop)
+        doctop += page.height
+        yield page
+
+
+def _cache_dir() -> pathlib.Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return pathlib.Path(base) / "pdf_extractor"
+
+
+def _cache_key(pdf_path: str, num_pages: int, preserve_layout: bool) -> str:
+    """
+    Fingerprint the PDF from its size and first/last 64 KB plus the extraction
+    options and text backend.
+
+    num_pages is the number of pages actually extracted (max_pages clamped to
+    the document), so max_pages=10 and 20 share an entry for a 4-page PDF.
+    PDFium and pdfplumber produce slightly different text, so installing or
+    removing pypdfium2 must not serve the other backend's output.
+    """
+    size = os.path.getsize(pdf_path)
+    with open(pdf_path, "rb") as f:
+        head = f.read(CACHE_PROBE_BYTES)
+        f.seek(max(size - CACHE_PROBE_BYTES, 0))
+        tail = f.read(CACHE_PROBE_BYTES)
+    digest = hashlib.sha1(head)
+    digest.update(tail)
+    digest.update(f"{size}:{num_pages}:{preserve_layout}:{pdfium is not None}:{CACHE_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> pathlib.Path:
+    return _cache_dir() / (f"{key}.json.zst" if zstandard is not None else f"{key}.json")
+
+
+def _cache_load(key: str) -> Optional[List[Dict[str, Any]]]:
+    """Return cached search results, or None on a miss or unreadable entry."""
+    path = _cache_path(key)
+    try:
+        data = path.read_bytes()
+        if zstandard is not None:
+            data = zstandard.ZstdDecompressor().decompress(data)
+        results = _json_loads(data)
+    except Exception:
+        # Missing file, truncated write or corrupt frame: treat as a miss
+        return None
+    try:
+        # Mark as recently used so eviction is least-recently-used
+        os.utime(path)
+    except OSError:
+        pass
+    return results
+
+
+def _cache_store(key: str, results: List[Dict[str, Any]]) -> None:
+    """Best-effort write of search results; caching never fails an extraction."""
+    path = _cache_path(key)
+    try:
+        data = _json_dumps(results)
+        if zstandard is not None:
+            data = zstandard.ZstdCompressor().compress(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except Exception:
+        return
+    _cache_prune(path.parent)
+
+
+def _cache_prune(cache_dir: pathlib.Path) -> None:
+    """Evict stale entries, then the least recently used ones until under CACHE_MAX_BYTES."""
+    entries = []
+    try:
+        for entry in os.scandir(cache_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - CACHE_MAX_AGE_SECONDS
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def _cached_extract(
+    pdf_path: str,
+    num_pages: int,
+    preserve_layout: bool,
+    use_cache: bool,
+    extract: Callable[[], List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """Return the cached results for this PDF and options, or run extract() and cache them."""
+    if not use_cache or num_pages <= 0:
+        return extract()
+
+    key = _cache_key(pdf_path, num_pages, preserve_layout)
+    results = _cache_load(key)
+    if results is None:
+        results = extract()
+        _cache_store(key, results)
+    return results
+
+
+def _get_max_workers(num_pages: int) -> int:
+    """Size the worker pool from the CPUs this process may actually run on."""
+    try:
+        # Respects taskset/cgroup cpusets in containers, unlike os.cpu_count()
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, num_pages, MAX_WORKERS_CAP))
+
+
+def _is_single_column(page) -> bool:
+    """
+    Heuristic: the body text of a multi-column page leaves an empty gutter.
+
+    Characters are grouped into lines and each line is split into segments
+    at gaps of COLUMN_MIN_GUTTER or more. Ignoring segments that span most of
+    the text width (titles, abstracts), the page is multi-column if the
+    remaining segments leave a strip at least COLUMN_MIN_GUTTER wide that is
+    (almost) uncovered, with body text on both sides of it.
+    """
+    lines = defaultdict(list)
+    for char in page.chars:
+        if char["text"].strip():
+            lines[round(char["top"])].append((char["x0"], char["x1"]))
+
+    segments = []
+    for spans in lines.values():
+        spans.sort()
+        start, end = spans[0]
+        for x0, x1 in spans[1:]:
+            if x0 - end >= COLUMN_MIN_GUTTER:
+                segments.append((start, end))
+                start = x0
+            end = max(end, x1)
+        segments.append((start, end))
+    if not segments:
+        return False
+
+    left = min(x0 for x0, _ in segments)
+    right = max(x1 for _, x1 in segments)
+    body = [(x0, x1) for x0, x1 in segments if x1 - x0 < COLUMN_SPAN_RATIO * (right - left)]
+    if not body:
+        return True
+
+    # Number of body segments covering each 1pt-wide strip of the text width
+    width = int(math.ceil(right - left)) + 1
+    delta = [0] * (width + 1)
+    for x0, x1 in body:
+        delta[int(x0 - left)] += 1
+        delta[int(math.ceil(x1 - left))] -= 1
+    coverage = list(accumulate(delta[:width]))
+
+    peak = max(coverage)
+    threshold = peak * COLUMN_GUTTER_RATIO
+    gap_start = None
+    for x, count in enumerate(coverage):
+        if count <= threshold:
+            if gap_start is None:
+                gap_start = x
+            continue
+        if (
+            gap_start is not None
+            and x - gap_start >= COLUMN_MIN_GUTTER
+            and max(coverage[:gap_start]) >= peak / 2
+            and max(coverage[x:]) >= peak / 2
+        ):
+            return False
+        gap_start = None
+    return True
+
+
+def _page_layouts(pdf, num_pages: int, preserve_layout: bool) -> List[bool]:
+    """
+    Per-page preserve_layout flags for the process-pool path.
+
+    Layout padding only pays off on multi-column pages, so when page 1 of a
+    layout-mode extraction is single-column the remaining pages use the
+    plain text path. Workers need their flags before dispatch, so this
+    parses page 1 in the driver on top of the worker's own parse; the
+    in-process loop decides on the page it already holds instead.
+    """
+    if not preserve_layout or num_pages <= 1:
+        return [preserve_layout] * num_pages
+
+    first_page = next(_iter_pages(pdf, 1))
+    try:
+        single_column = _is_single_column(first_page)
+    finally:
+        first_page.close()
+    return [True] + [not single_column] * (num_pages - 1)
+
+
+def _iter_search_results(
+    pdf,
+    pdf_path: str,
+    num_pages: int,
+    max_workers: Optional[int],
+    preserve_layout: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """Yield non-empty search_result blocks for the first num_pages of an open PDF."""
+    if num_pages <= 0:
+        return
+
+    if max_workers is None:
+        max_workers = _get_max_workers(num_pages)
+
+    # One citations dict per extraction, shared by its blocks but never across calls
+    citations = {"enabled": True}
+
+    if max_workers <= 1 or num_pages <= 1:
+        # In layout mode PDFium is only needed if pages 2..N drop to plain text
+        with _pdfium_document(pdf_path, enabled=not preserve_layout or num_pages > 1) as pdfium_doc:
+            page_layout = preserve_layout
+            pdfium_texts = None
+            try:
+                for page in _iter_pages(pdf, num_pages):
+                    # Start prefetching once pages switch to the plain text path
+                    if pdfium_texts is None and not page_layout and pdfium_doc is not None:
+                        pdfium_texts = _iter_pdfium_prefetch(pdfium_doc, num_pages, start=page.page_number - 1)
+                    pdfium_text = next(pdfium_texts) if pdfium_texts is not None else None
+                    result = _extract_page(page, page.page_number, page_layout, pdfium_text, citations)
+                    # Same rule as _page_layouts, reusing page 1's already-parsed chars
+                    if page_layout and page.page_number == 1 and num_pages > 1 and _is_single_column(page):
+                        page_layout = False
+                    # Release the page's cached chars/objects/edges and text map so
+                    # memory stays flat across pages
+                    page.close()
+                    del page
+                    if result is not None:
+                        yield result
+            finally:
+                if pdfium_texts is not None:
+                    pdfium_texts.close()
+        return
+
+    layouts = _page_layouts(pdf, num_pages, preserve_layout)
+    with ProcessPoolExecutor(max_workers=min(max_workers, num_pages)) as ex:
+        # map() preserves page order and yields each result as soon as it is ready
+        for result in ex.map(_extract_one_page, repeat(pdf_path), range(num_pages), layouts):
+            if result is not None:
+                result["citations"] = citations
+                yield result
+
+
+def extract_pdf(
+    pdf_path: str,
+    max_pages: int = 10,
+    max_workers: Optional[int] = None,
+    preserve_layout: bool = False,
+    use_cache: bool = True,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Extract metadata and search_result blocks from a single open of the PDF.
+
+    Returns:
+        (metadata, search_results) as produced by extract_pdf_metadata and
+        extract_pdf_for_search_results
+    """
+    with _open_pdf(pdf_path) as pdf:
+        total_pages = _count_pages(pdf)
+        metadata = {
+            "num_pages": total_pages,
+            "metadata": pdf.metadata or {}
+        }
+        num_pages = max(min(total_pages, max_pages), 0)
+        results = _cached_extract(
+            pdf_path, num_pages, preserve_layout, use_cache,
+            lambda: list(_iter_search_results(pdf, pdf_path, num_pages, max_workers, preserve_layout)),
+        )
+
+    return metadata, results
+
+
+def iter_pdf_search_results(
+    pdf_path: str,
+    max_pages: int = 10,
+    max_workers: Optional[int] = None,
+    preserve_layout: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield search_result blocks in page order as each page finishes.
+
+    Pages are parsed in parallel worker processes (pdfplumber is CPU-bound);
+    max_workers defaults to the available CPUs (capped at 8); pass
+    max_workers=1 to extract in-process. Set preserve_layout to keep
+    pdfplumber's whitespace-padded layout text instead of plain reading order;
+    if page 1 turns out to be single-column, later pages use plain text.
+    """
+    with _open_pdf(pdf_path) as pdf:
+        num_pages = _count_pages(pdf, limit=max(max_pages, 0))
+        yield from _iter_search_results(pdf, pdf_path, num_pages, max_workers, preserve_layout)
+
+
+def extract_pdf_for_search_results(
+    pdf_path: str,
+    max_pages: int = 10,
+    max_workers: Optional[int] = None,
+    preserve_layout: bool = False,
+    use_cache: bool = True,
+) -> List[Dict[str, Any]]:
     """
     Extract PDF pages into Search Results format for Claude API.
 
+    Results are cached under ~/.cache/pdf_extractor (or $XDG_CACHE_HOME),
+    keyed on the file's size, first/last 64 KB and the extraction options,
+    and evicted after 30 days unused or past 256 MB in total; pass
+    use_cache=False to always re-extract.
+
     Returns:
         List of search_result blocks ready for Claude API
     """
-    search_results = []
+    with _open_pdf(pdf_path) as pdf:
+        num_pages = _count_pages(pdf, limit=max(max_pages, 0))
+        return _cached_extract(
+            pdf_path, num_pages, preserve_layout, use_cache,
+            lambda: list(_iter_search_results(pdf, pdf_path, num_pages, max_workers, preserve_layout)),
+        )
 
-    with pdfplumber.open(pdf_path) as pdf:
-        num_pages = min(len(pdf.pages), max_pages)
 
-        for i, page in enumerate(pdf.pages[:num_pages]):
-            page_num = i + 1
+def write_search_results_stream(results: Iterable[Dict[str, Any]], out: Optional[BinaryIO] = None) -> None:
+    """
+    Write results as a compact JSON array, one item at a time.
 
-            # Extract text with layout preservation
-            text = page.extract_text(layout=True) or ""
+    A serializer thread drains a bounded queue so extraction and output
+    overlap without buffering the whole document in memory. Output goes to
+    the binary stream out (default: stdout). results is closed on return or
+    error, so a generator's open documents and loader threads are released.
+    """
+    if out is None:
+        out = sys.stdout.buffer
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    done, aborted = object(), object()
+    # Exception raised by the serializer thread (e.g. broken pipe, disk full)
+    write_error: List[BaseException] = []
 
-            # Extract tables separately for better structure
-            tables = page.extract_tables()
-            table_text = ""
-            if tables:
-                for j, table in enumerate(tables):
-                    if table and len(table) > 0:
-                        table_text += f"\n[Table {j+1}]\n"
-                        for row in table:
-                            if row:
-                                row_text = " | ".join(str(cell) if cell else "" for cell in row)
-                                table_text += row_text + "\n"
-
-            # Combine text and tables
-            full_text = text
-            if table_text:
-                full_text += "\n\n--- Tables ---" + table_text
-
-            # Skip empty pages
-            if not full_text.strip():
-                continue
+    def serialize() -> None:
+        try:
+            out.write(b"[")
+            first = True
+            while True:
+                item = pending.get()
+                if item is done or item is aborted:
+                    break
+                if not first:
+                    out.write(b",")
+                out.write(_json_dumps(item))
+                out.flush()
+                first = False
+            # Leave the array unterminated on failure so consumers can't mistake it for a full result
+            if item is done:
+                out.write(b"]\n")
+            out.flush()
+        except BaseException as e:
+            write_error.append(e)
 
-            # Create search_result block
-            search_result = {
-                "type": "search_result",
-                "source": f"page-{page_num}",
-                "title": f"Page {page_num}",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": full_text.strip()
-                    }
-                ],
-                "citations": {
-                    "enabled": True
-                }
-            }
+    def put(item: Any) -> None:
+        # Stop feeding the queue once the writer has died, or we would block forever
+        while writer.is_alive():
+            try:
+                pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
 
-            search_results.append(search_result)
+    writer = threading.Thread(target=serialize, daemon=True)
+    writer.start()
+    try:
+        for result in results:
+            if write_error:
+                break
+            put(result)
+    except BaseException:
+        put(aborted)
+        raise
+    else:
+        put(done)
+    finally:
+        writer.join()
+        close = getattr(results, "close", None)
+        if close is not None:
+            close()
 
-    return search_results
+    if write_error:
+        raise write_error[0]
 
 
 def extract_pdf_metadata(pdf_path: str) -> Dict[str, Any]:
     """Extract PDF metadata."""
-    with pdfplumber.open(pdf_path) as pdf:
-        return {
-            "num_pages": len(pdf.pages),
-            "metadata": pdf.metadata or {}
-        }
+    metadata, _ = extract_pdf(pdf_path, max_pages=0)
+    return metadata
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python pdf_extractor.py <pdf_path> [max_pages]", file=sys.stderr)
-        sys.exit(1)
-
-    pdf_path = sys.argv[1]
-    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    parser = argparse.ArgumentParser(description="Extract PDF pages as Claude search_result blocks")
+    parser.add_argument("pdf_path")
+    parser.add_argument("max_pages", nargs="?", type=int, default=10)
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="worker processes to use (default: available CPUs, max 8; 1 = in-process)")
+    parser.add_argument("--layout", action="store_true",
+                        help="preserve page layout with whitespace padding (slower)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-extract even if a cached result exists")
+    parser.add_argument("--stream", action="store_true",
+                        help="emit a compact JSON array incrementally as pages complete (uncached)")
+    args = parser.parse_args()
 
     try:
-        # Extract and output as JSON
-        results = extract_pdf_for_search_results(pdf_path, max_pages)
-        print(json.dumps(results, indent=2))
+        if args.stream:
+            write_search_results_stream(
+                iter_pdf_search_results(
+                    args.pdf_path, args.max_pages, max_workers=args.max_workers, preserve_layout=args.layout
+                )
+            )
+        else:
+            # Extract and output as JSON
+            results = extract_pdf_for_search_results(
+                args.pdf_path, args.max_pages, max_workers=args.max_workers,
+                preserve_layout=args.layout, use_cache=not args.no_cache
+            )
+            sys.stdout.buffer.write(_json_dumps(results, indent=True) + b"\n")
     except Exception as e:
         print(json.dumps({"error": str(e)}), file=sys.stderr)
         sys.exit(1)
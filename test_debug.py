@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Debug test - capture console errors and test extraction."""
 
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 import time
 
 PDF_PATH = "/Users/matheusrech/MinerU/Mattar2021.pdf-c3200d8d-f94a-437d-984f-f76c1f00b11b/Mattar 2021.pdf"
@@ -26,7 +26,7 @@ def test_with_debug():
         print("2. Uploading PDF...")
         file_input = page.locator('input[type="file"]')
         file_input.set_input_files(PDF_PATH)
-        page.wait_for_timeout(5000)
+        page.wait_for_selector('.page-container', timeout=5000)
         print("   ✓ PDF uploaded")
 
         print("3. Checking button state...")
@@ -41,7 +41,12 @@ def test_with_debug():
         # Wait and monitor
         print("5. Monitoring for 60 seconds...")
         for i in range(12):
-            page.wait_for_timeout(5000)
+            # Returns as soon as results render instead of sleeping the full 5s
+            try:
+                page.wait_for_selector('button:has-text("Study ID")', timeout=5000)
+                results_ready = True
+            except PlaywrightTimeoutError:
+                results_ready = False
             page.screenshot(path=f'/tmp/debug_{i:02d}.png')
             print(f"   [{(i+1)*5}s] Screenshot saved")
 
@@ -51,8 +56,7 @@ def test_with_debug():
                 print(f"   [{(i+1)*5}s] Loading indicator visible")
 
             # Check for results
-            study_id_btn = page.locator('button:has-text("Study ID")').count()
-            if study_id_btn > 0:
+            if results_ready:
                 print(f"   [{(i+1)*5}s] ✓ Results appeared!")
                 break
 
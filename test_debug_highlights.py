@@ -1,5 +1,5 @@
 """Debug: See exactly what's being highlighted"""
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 def debug_highlights():
     with sync_playwright() as p:
@@ -16,13 +16,16 @@ def debug_highlights():
         file_input = page.locator('input[type="file"]')
         file_input.evaluate("el => el.style.display = 'block'")
         file_input.set_input_files('/Users/matheusrech/MinerU/Mattar2021.pdf-c3200d8d-f94a-437d-984f-f76c1f00b11b/Mattar 2021.pdf')
-        page.wait_for_timeout(3000)
+        page.wait_for_selector('.page-container', timeout=5000)
 
         # Enable demo and extract
         page.click('text=Demo Mode')
-        page.wait_for_timeout(300)
         page.click('button:has-text("Run Demo")')
-        page.wait_for_timeout(2500)
+        try:
+            page.wait_for_selector('.page-container span[style*="background"]', timeout=5000)
+        except PlaywrightTimeoutError:
+            # No highlights rendered: still report the (empty) analysis below
+            pass
 
         # Count highlights per page
         print("=== HIGHLIGHT ANALYSIS ===\n")
@@ -0,0 +1,22 @@
+"""Shared fixtures for the pdf_extractor unit tests (run with `python -m pytest tests`)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+
+# 4 pages: body text, a ruled 3x3 table, a blank page, an image-only (scanned) page
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sample.pdf")
+
+
+@pytest.fixture
+def sample_pdf():
+    return SAMPLE_PDF
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep the result cache out of the developer's ~/.cache."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache" / "pdf_extractor"
@@ -0,0 +1,340 @@
+"""In-process tests for services/pdf_extractor.py (no browser, no sleeps)."""
+import io
+import json
+import os
+import threading
+import types
+
+import pdfplumber
+import pytest
+
+import pdf_extractor
+
+
+def test_extracts_text_and_table_pages(sample_pdf):
+    results = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+
+    assert [r["source"] for r in results] == ["page-1", "page-2"]
+    assert results[0]["type"] == "search_result"
+    assert results[0]["title"] == "Page 1"
+    assert results[0]["citations"] == {"enabled": True}
+    assert "Page 1 line 0 mortality rate 12.5%" in results[0]["content"][0]["text"]
+
+
+def test_table_rows_are_serialized(sample_pdf):
+    results = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+    text = results[1]["content"][0]["text"]
+
+    assert "--- Tables ---\n[Table 1]\nVariable|Surgery|Control\nAge|54.1|55.3\nMale|0|12" in text
+    assert "--- Tables ---" not in results[0]["content"][0]["text"]
+
+
+def test_table_cells_are_escaped():
+    tables = [[["a|b", 'say "hi"', "two\nlines"], [None, "x", ""], [None], ["", None], []]]
+
+    assert pdf_extractor._format_tables(tables) == (
+        '\n[Table 1]\n"a|b"|"say ""hi"""|"two\nlines"\n|x|\n'
+    )
+
+
+def test_blank_and_scanned_pages_are_skipped(sample_pdf):
+    results = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=10, max_workers=1)
+
+    assert [r["source"] for r in results] == ["page-1", "page-2"]
+
+
+def test_max_pages_limits_extraction(sample_pdf):
+    results = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=1, max_workers=1)
+
+    assert [r["source"] for r in results] == ["page-1"]
+
+
+def test_only_extracted_pages_are_built(sample_pdf, monkeypatch):
+    built = []
+    original = pdfplumber.page.Page.__init__
+
+    def init(self, pdf, page_obj, page_number, *args, **kwargs):
+        built.append(page_number)
+        original(self, pdf, page_obj, page_number, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber.page.Page, "__init__", init)
+
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+    assert built == [1, 2]
+
+    # Metadata and cache hits build no pages at all
+    built.clear()
+    pdf_extractor.extract_pdf_metadata(sample_pdf)
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+    assert built == []
+
+
+def test_parallel_matches_in_process(sample_pdf):
+    serial = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1, use_cache=False)
+    parallel = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=2, use_cache=False)
+
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_memory_mapped_pdf_matches_buffered(sample_pdf, tmp_path, monkeypatch, max_workers):
+    buffered = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=max_workers, use_cache=False)
+    # Logged to a file so maps made inside worker processes are counted too
+    log = tmp_path / "mmap.log"
+    original = pdf_extractor.mmap.mmap
+
+    def track(*args, **kwargs):
+        with open(log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        return original(*args, **kwargs)
+
+    # Workers are forked, so the patched threshold and mmap apply to the pool path too
+    monkeypatch.setattr(pdf_extractor, "MMAP_THRESHOLD_BYTES", 0)
+    monkeypatch.setattr(pdf_extractor.mmap, "mmap", track)
+
+    assert pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=max_workers, use_cache=False
+    ) == buffered
+    # Driver plus one open per page in each worker
+    assert len(log.read_text().split()) == (1 if max_workers == 1 else 1 + 4)
+
+
+@pytest.mark.parametrize("preserve_layout", [False, True])
+def test_pdfplumber_text_fallback(sample_pdf, monkeypatch, preserve_layout):
+    expected = pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=1, preserve_layout=preserve_layout, use_cache=False
+    )
+    monkeypatch.setattr(pdf_extractor, "pdfium", None)
+    results = pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=1, preserve_layout=preserve_layout, use_cache=False
+    )
+
+    assert [r["source"] for r in results] == ["page-1", "page-2"]
+    assert "Variable|Surgery|Control" in results[1]["content"][0]["text"]
+    if not preserve_layout:
+        assert results[0]["content"][0]["text"].split() == expected[0]["content"][0]["text"].split()
+
+
+def test_layout_mode_drops_to_plain_text_after_single_column_first_page(sample_pdf):
+    plain = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1, use_cache=False)
+    layout = pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=1, preserve_layout=True, use_cache=False
+    )
+
+    # Page 1 keeps layout padding; page 2 goes through the plain path
+    assert layout[0]["content"][0]["text"] != plain[0]["content"][0]["text"]
+    assert layout[1] == plain[1]
+
+
+def test_layout_mode_parses_first_page_once_in_process(sample_pdf, monkeypatch):
+    parsed = []
+    original = pdf_extractor._is_single_column
+    monkeypatch.setattr(pdf_extractor, "_page_layouts", lambda *args: pytest.fail("pool-only probe used"))
+    monkeypatch.setattr(pdf_extractor, "_is_single_column", lambda page: parsed.append(page) or original(page))
+
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1, preserve_layout=True, use_cache=False)
+
+    assert [page.page_number for page in parsed] == [1]
+
+
+def _fake_page(columns, lines=40, title_lines=0, char_width=5, word_gap=3):
+    """Page stub whose chars fill the given (x0, x1) column extents line by line."""
+    chars = []
+
+    def fill(x0, x1, top):
+        x = x0
+        while x + char_width <= x1:
+            chars.append({"text": "a", "x0": x, "x1": x + char_width, "top": top})
+            x += char_width
+            if len(chars) % 4 == 0:
+                x += word_gap
+
+    for i in range(title_lines):
+        fill(columns[0][0], columns[-1][1], 12 * i)
+    for i in range(title_lines, title_lines + lines):
+        for x0, x1 in columns:
+            fill(x0 + 7 * (i % 3), x1, 12 * i)
+    return types.SimpleNamespace(chars=chars)
+
+
+@pytest.mark.parametrize("gutter", [14, 18, 40])
+@pytest.mark.parametrize("title_lines", [0, 8])
+def test_two_column_page_is_not_single_column(gutter, title_lines):
+    middle = 306
+    page = _fake_page([(72, middle - gutter / 2), (middle + gutter / 2, 540)], title_lines=title_lines)
+
+    assert not pdf_extractor._is_single_column(page)
+
+
+@pytest.mark.parametrize("title_lines", [0, 8])
+def test_one_column_page_is_single_column(sample_pdf, title_lines):
+    assert pdf_extractor._is_single_column(_fake_page([(72, 540)], title_lines=title_lines))
+    with pdf_extractor._open_pdf(sample_pdf) as pdf:
+        assert pdf_extractor._is_single_column(next(pdf_extractor._iter_pages(pdf, 1)))
+
+
+def test_layout_mode_pool_matches_in_process(sample_pdf):
+    serial = pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=1, preserve_layout=True, use_cache=False
+    )
+    parallel = pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=2, preserve_layout=True, use_cache=False
+    )
+
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_citations_are_not_shared_across_calls(sample_pdf, max_workers):
+    first = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=max_workers, use_cache=False)
+    first[0]["citations"]["enabled"] = False
+
+    second = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=max_workers, use_cache=False)
+    assert all(result["citations"] == {"enabled": True} for result in second)
+
+
+def test_extract_pdf_returns_metadata_and_results(sample_pdf):
+    metadata, results = pdf_extractor.extract_pdf(sample_pdf, max_pages=10, max_workers=1)
+
+    assert metadata["num_pages"] == 4
+    assert metadata["metadata"]["Title"] == "pdf_extractor test sample"
+    assert results == pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1)
+    assert pdf_extractor.extract_pdf_metadata(sample_pdf) == metadata
+
+
+@pytest.mark.parametrize("declared_count", [2, 6])
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_wrong_catalog_page_count_is_ignored(sample_pdf, tmp_path, declared_count, max_workers):
+    broken = tmp_path / "wrong_count.pdf"
+    broken.write_bytes(open(sample_pdf, "rb").read().replace(b"/Count 4", f"/Count {declared_count}".encode()))
+
+    metadata, results = pdf_extractor.extract_pdf(str(broken), max_workers=max_workers, use_cache=False)
+
+    assert metadata["num_pages"] == 4
+    assert [r["source"] for r in results] == ["page-1", "page-2"]
+
+
+def test_results_are_cached(sample_pdf, isolated_cache, monkeypatch):
+    first = pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1)
+    assert len(list(isolated_cache.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(pdf_extractor, "_iter_search_results", fail)
+    assert pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1) == first
+    # max_pages beyond the page count shares the entry; extract_pdf uses the same cache
+    assert pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=50, max_workers=1) == first
+    assert pdf_extractor.extract_pdf(sample_pdf, max_workers=1)[1] == first
+    with pytest.raises(AssertionError):
+        pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1, use_cache=False)
+
+
+def test_unencodable_text_does_not_fail_extraction(sample_pdf, monkeypatch):
+    results = [{"type": "search_result", "content": [{"type": "text", "text": "a\ud800b"}]}]
+    monkeypatch.setattr(pdf_extractor, "_iter_search_results", lambda *args: iter(results))
+
+    assert pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1) == results
+    assert json.loads(pdf_extractor._json_dumps(results, indent=True)) == results
+
+    def fail(*args, **kwargs):
+        raise ValueError("cannot serialize")
+
+    monkeypatch.setattr(pdf_extractor, "_json_dumps", fail)
+    assert pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_workers=1, max_pages=2) == results
+
+
+def test_cache_key_depends_on_text_backend(sample_pdf, monkeypatch):
+    with_pdfium = pdf_extractor._cache_key(sample_pdf, 4, False)
+    monkeypatch.setattr(pdf_extractor, "pdfium", None)
+
+    assert pdf_extractor._cache_key(sample_pdf, 4, False) != with_pdfium
+
+
+def test_cache_evicts_stale_entries(sample_pdf, isolated_cache):
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=1, max_workers=1)
+    (stale,) = isolated_cache.iterdir()
+    os.utime(stale, (1, 1))
+
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+
+    entries = list(isolated_cache.iterdir())
+    assert len(entries) == 1 and entries[0] != stale
+
+
+def test_cache_evicts_least_recently_used_over_size_cap(sample_pdf, isolated_cache, monkeypatch):
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=1, max_workers=1)
+    pdf_extractor.extract_pdf_for_search_results(sample_pdf, max_pages=2, max_workers=1)
+    older, newer = sorted(isolated_cache.iterdir(), key=lambda e: e.stat().st_size)
+    os.utime(older, (newer.stat().st_mtime - 60,) * 2)
+    monkeypatch.setattr(pdf_extractor, "CACHE_MAX_BYTES", max(older.stat().st_size, newer.stat().st_size))
+
+    pdf_extractor._cache_prune(isolated_cache)
+
+    assert list(isolated_cache.iterdir()) == [newer]
+
+
+def test_stream_writes_json_array(sample_pdf):
+    out = io.BytesIO()
+    pdf_extractor.write_search_results_stream(
+        pdf_extractor.iter_pdf_search_results(sample_pdf, max_workers=1), out
+    )
+
+    assert json.loads(out.getvalue()) == pdf_extractor.extract_pdf_for_search_results(
+        sample_pdf, max_workers=1, use_cache=False
+    )
+
+
+def test_stream_leaves_array_open_on_error():
+    def results():
+        yield {"source": "page-1"}
+        raise RuntimeError("boom")
+
+    out = io.BytesIO()
+    with pytest.raises(RuntimeError):
+        pdf_extractor.write_search_results_stream(results(), out)
+
+    with pytest.raises(ValueError):
+        json.loads(out.getvalue())
+
+
+class _FailingStream(io.BytesIO):
+    def write(self, data):
+        if self.tell() > 0:
+            raise BrokenPipeError("closed")
+        return super().write(data)
+
+
+def test_stream_raises_writer_errors():
+    results = ({"source": f"page-{i}"} for i in range(pdf_extractor.STREAM_QUEUE_SIZE * 4))
+
+    with pytest.raises(BrokenPipeError):
+        pdf_extractor.write_search_results_stream(results, _FailingStream())
+
+
+def test_stream_releases_extraction_on_writer_errors(sample_pdf):
+    threads = set(threading.enumerate())
+    results = pdf_extractor.iter_pdf_search_results(sample_pdf, max_workers=1)
+
+    with pytest.raises(BrokenPipeError):
+        pdf_extractor.write_search_results_stream(results, _FailingStream())
+
+    # The generator was closed, so its PDFium loader thread has been joined
+    assert set(threading.enumerate()) <= threads
+    with pytest.raises(StopIteration):
+        next(results)
+
+
+def test_pdfium_prefetch_raises_if_loader_dies(monkeypatch):
+    def fail(pdfium_doc, page_index):
+        raise MemoryError("loader died")
+
+    monkeypatch.setattr(pdf_extractor, "_pdfium_page_text", fail)
+
+    with pytest.raises(MemoryError):
+        next(pdf_extractor._iter_pdfium_prefetch(None, 3))
+
+
+def test_get_max_workers_is_bounded():
+    assert pdf_extractor._get_max_workers(1) == 1
+    assert 1 <= pdf_extractor._get_max_workers(100) <= pdf_extractor.MAX_WORKERS_CAP